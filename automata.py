@@ -1,23 +1,74 @@
 #!/usr/bin/env python
-import xmltodict
-import re
-from collections import Set
-from io import StringIO
+# xmltodict, jflap, re and io are imported where they are used so the CLI only
+# loads what its code path (JFLAP in, JFLAP or LaTeX out) needs
+import os
+import sys
+from bisect import bisect_right
+from collections import deque
 
 
 class State:
-    last_id = 0
 
     def __init__(self, name=None, initial=False, final=False, id=-1, transitions=None):
-        if id == -1:
-            self.id = State.last_id
-            State.last_id += 1
-        else:
-            self.id = int(id)
-        self.name = 'q{}'.format(self.id) if name == None else name
+        # id == -1 means the state gets its id from the automaton it is added to
+        self.id = int(id)
+        self._name = name
         self.initial = initial
         self.final = final
-        self.transitions = transitions if transitions != None else {}
+        self._transitions = transitions if transitions != None else {}
+        # states built by dfa_transform keep one entry per symbol class in
+        # class_transitions instead, expanded the first time transitions is used
+        self.classes = None
+        self.class_transitions = None
+
+    @property
+    def transitions(self):
+        if self.class_transitions != None:
+            self._transitions = {symbol: list(targets) for symbol, targets in self.symbol_transitions()}
+            self.classes = self.class_transitions = None
+        return self._transitions
+
+    @transitions.setter
+    def transitions(self, transitions):
+        self._transitions = transitions
+        self.classes = self.class_transitions = None
+
+    def set_class_transitions(self, classes, transitions):
+        """
+            Replaces the transitions with transitions, a dict from class index to targets
+        """
+        self._transitions = {}
+        self.classes = classes
+        self.class_transitions = transitions
+
+    def symbol_transitions(self):
+        """
+            Returns the (symbol, targets) pairs of the state without expanding class transitions
+        """
+        if self.class_transitions == None:
+            return list(self._transitions.items())
+        classes = self.classes.classes
+        return [(symbol, targets) for c, targets in self.class_transitions.items() for symbol in classes[c]]
+
+    def targets(self, read):
+        if self.class_transitions == None:
+            return self._transitions.get(read)
+        c = self.classes.index.get(read)
+        return self.class_transitions.get(c) if c != None else None
+
+    def successors(self):
+        transitions = self.class_transitions if self.class_transitions != None else self._transitions
+        return [to for targets in transitions.values() for to in targets]
+
+    @property
+    def name(self):
+        if self._name != None:
+            return self._name
+        return 'q{}'.format(self.id) if self.id != -1 else 'q?'
+
+    @name.setter
+    def name(self, name):
+        self._name = name
 
     def addTransition(self, read, to):
         if read in self.transitions:
@@ -34,17 +85,23 @@ class State:
         return res
 
     def transitionList(self):
-        return [{'from': self.id, 'to': to.id, 'read': transition} for transition in self.transitions for to in self.transitions[transition]]
+        return [{'from': self.id, 'to': to.id, 'read': read} for read, targets in self.symbol_transitions() for to in targets]
 
+    # states that aren't in an automaton yet (id == -1) are only equal to themselves,
+    # so don't put them in sets or dict keys before add_state gives them an id
     def __hash__(self):
-        return hash(self.id)
+        return hash(self.id) if self.id != -1 else object.__hash__(self)
 
     def __lt__(self, other):
         return self.id < other.id
 
     def __eq__(self, other):
         if isinstance(other, int):
-            return self.id == other
+            return self.id == other and self.id != -1
+        if not isinstance(other, State):
+            return NotImplemented
+        if self.id == -1 or other.id == -1:
+            return self is other
         return self.id == other.id
 
     def __str__(self):
@@ -57,49 +114,484 @@ class State:
                 [
                     "read: {}, to: {}".format(
                         x,
-                        ", ".join([str(k.name) for k in self.transitions[x]])
-                    ) for x in self.transitions]
+                        ", ".join([str(k.name) for k in targets])
+                    ) for x, targets in self.symbol_transitions()]
             )
         )
 
     __repr__ = __str__
 
 
+class SymbolClasses:
+    """
+        Partition of an alphabet into classes of symbols every state treats the same
+    """
+
+    def __init__(self, classes):
+        self.classes = classes
+        self.index = {symbol: c for c, symbols in enumerate(classes) for symbol in symbols}
+        # single character symbols are also kept as code point ranges, looked up with bisect
+        points = sorted((ord(symbol), c) for symbol, c in self.index.items()
+                        if isinstance(symbol, str) and len(symbol) == 1)
+        self.starts, self.ends, self.range_classes = [], [], []
+        for point, c in points:
+            if self.ends and self.ends[-1] == point - 1 and self.range_classes[-1] == c:
+                self.ends[-1] = point
+            else:
+                self.starts.append(point)
+                self.ends.append(point)
+                self.range_classes.append(c)
+
+    @staticmethod
+    def fromAutomaton(automaton):
+        signatures = {}
+        for state in automaton.states.values():
+            for read, targets in state.symbol_transitions():
+                signatures.setdefault(read, []).extend((state.id, to.id) for to in targets)
+        groups = {}
+        for read, signature in signatures.items():
+            # empty reads (lambda transitions) never share a class with real symbols
+            key = (read is None, tuple(sorted(set(signature))))
+            groups.setdefault(key, []).append(read)
+        classes = [sorted(symbols, key=symbol_key) for symbols in groups.values()]
+        classes.sort(key=lambda symbols: symbol_key(symbols[0]))
+        return SymbolClasses(classes)
+
+    def lookup(self, symbol):
+        """
+            Returns the class of symbol or -1 if it isn't in the alphabet
+        """
+        if isinstance(symbol, str) and len(symbol) == 1:
+            point = ord(symbol)
+            i = bisect_right(self.starts, point) - 1
+            if i >= 0 and point <= self.ends[i]:
+                return self.range_classes[i]
+            return -1
+        return self.index.get(symbol, -1)
+
+    def representatives(self):
+        return [symbols[0] for symbols in self.classes]
+
+    def __len__(self):
+        return len(self.classes)
+
+
+class TransitionTable:
+    """
+        Deterministic automaton compiled to rows of target ids, one column per symbol class
+    """
+
+    def __init__(self, classes, rows, initial, final):
+        self.classes = classes
+        self.rows = rows
+        self.initial = initial
+        self.final = final
+
+    def step(self, state, symbol):
+        c = self.classes.lookup(symbol)
+        return self.rows[state][c] if c != -1 else -1
+
+    def accepts(self, word):
+        state = self.initial
+        rows = self.rows
+        lookup = self.classes.lookup
+        for symbol in word:
+            c = lookup(symbol)
+            if c == -1:
+                return False
+            state = rows[state][c]
+            if state == -1:
+                return False
+        return self.final[state]
+
+    def edges(self, state):
+        """
+            Returns (target, number of symbols) pairs leaving state, one per target
+        """
+        sizes = {}
+        for c, target in enumerate(self.rows[state]):
+            if target != -1:
+                sizes[target] = sizes.get(target, 0) + len(self.classes.classes[c])
+        return list(sizes.items())
+
+    def count_words(self, n, modulus=None):
+        """
+            Returns the number of accepted words of each length 0..n, modulo modulus if given
+        """
+        edges = [self.edges(state) for state in range(len(self.rows))]
+        vector = [0] * len(self.rows)
+        vector[self.initial] = 1
+        counts = []
+        for length in range(n + 1):
+            count = sum(ways for state, ways in enumerate(vector) if ways and self.final[state])
+            counts.append(count % modulus if modulus else count)
+            if length == n:
+                break
+            following = [0] * len(self.rows)
+            for state, ways in enumerate(vector):
+                if ways:
+                    for target, size in edges[state]:
+                        following[target] += ways * size
+            if modulus:
+                following = [ways % modulus for ways in following]
+            vector = following
+        return counts
+
+    def useful_states(self):
+        """
+            Returns the states that are reachable from the initial state and can reach a final one
+        """
+        reachable = {self.initial}
+        pending = [self.initial]
+        incoming = [[] for _ in self.rows]
+        while pending:
+            state = pending.pop()
+            for target in self.rows[state]:
+                if target == -1:
+                    continue
+                incoming[target].append(state)
+                if target not in reachable:
+                    reachable.add(target)
+                    pending.append(target)
+        useful = {state for state in reachable if self.final[state]}
+        pending = list(useful)
+        while pending:
+            for source in incoming[pending.pop()]:
+                if source not in useful:
+                    useful.add(source)
+                    pending.append(source)
+        return useful
+
+    def words(self, max_length=None):
+        """
+            Lazily yields the accepted words (symbols concatenated) in shortlex order:
+            shorter words first, words of the same length in symbol order
+        """
+        useful = self.useful_states()
+        out = [None] * len(self.rows)
+        for state in useful:
+            ordered = sorted(
+                (symbol_key(symbol), '' if symbol is None else symbol, target)
+                for c, target in enumerate(self.rows[state]) if target in useful
+                for symbol in self.classes.classes[c])
+            out[state] = [(text, target) for key, text, target in ordered]
+        # alive[k][state]: some word of length k takes state to a final state
+        alive = [[state in useful and self.final[state] for state in range(len(self.rows))]]
+        length = 0
+        while max_length == None or length <= max_length:
+            if length > 0:
+                previous = alive[-1]
+                alive.append([out[state] != None and any(previous[target] for text, target in out[state])
+                              for state in range(len(self.rows))])
+            if not any(alive[length]):
+                return
+            if alive[length][self.initial]:
+                if length == 0:
+                    yield ''
+                else:
+                    path = []
+                    stack = [iter(out[self.initial])]
+                    while stack:
+                        remaining = length - len(path) - 1
+                        for text, target in stack[-1]:
+                            if not alive[remaining][target]:
+                                continue
+                            if remaining == 0:
+                                yield ''.join(path) + text
+                                continue
+                            path.append(text)
+                            stack.append(iter(out[target]))
+                            break
+                        else:
+                            stack.pop()
+                            if path:
+                                path.pop()
+            length += 1
+
+    def sample(self, length, rng=None):
+        """
+            Returns an accepted word of the given length chosen uniformly at random,
+            use sampler for more than one
+        """
+        return self.sampler(length, rng)()
+
+    def sampler(self, length, rng=None):
+        """
+            Returns a function that draws accepted words of the given length uniformly
+            at random, counting the words through each state only once
+        """
+        if rng == None:
+            import random as rng
+        # ways[k][state]: number of words of length k that take state to a final state
+        ways = [[1 if final else 0 for final in self.final]]
+        for k in range(length):
+            previous = ways[-1]
+            ways.append([sum(previous[target] * len(self.classes.classes[c])
+                             for c, target in enumerate(row) if target != -1)
+                         for row in self.rows])
+        if ways[length][self.initial] == 0:
+            raise ValueError('no accepted words of length {}'.format(length))
+
+        def draw():
+            word = []
+            state = self.initial
+            for remaining in range(length - 1, -1, -1):
+                pick = rng.randrange(ways[remaining + 1][state])
+                for c, target in enumerate(self.rows[state]):
+                    if target == -1:
+                        continue
+                    symbols = self.classes.classes[c]
+                    weight = ways[remaining][target]
+                    if pick < weight * len(symbols):
+                        symbol = symbols[pick // weight]
+                        word.append('' if symbol is None else symbol)
+                        state = target
+                        break
+                    pick -= weight * len(symbols)
+            return ''.join(word)
+
+        return draw
+
+
+def symbol_key(symbol):
+    return (symbol is not None, str(symbol))
+
+
+class DeterminizationLimit(Exception):
+    """
+        Raised by dfa_transform when it runs out of budget and isn't allowed to spill.
+        automaton is the part of the DFA built so far, or None once it was spilled to disk.
+    """
+
+    def __init__(self, message, automaton, pending):
+        super().__init__(message)
+        self.automaton = automaton
+        self.pending = pending
+
+
+class SubsetTable:
+    """
+        What dfa_transform builds, in memory: subset -> id table, frontier of subsets
+        still to be expanded and the finished states (final flag, class -> target id)
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.frontier = deque()
+        self.final = []
+        self.transitions = []
+
+    def get(self, subset):
+        return self.ids.get(subset)
+
+    def add(self, subset, id, final):
+        self.ids[subset] = id
+        self.frontier.append((subset, id))
+        self.final.append(final)
+        self.transitions.append(None)
+
+    def set_transitions(self, id, transitions):
+        self.transitions[id] = transitions
+
+    def pop(self):
+        return self.frontier.popleft() if self.frontier else None
+
+    def pending(self):
+        return len(self.frontier)
+
+    def in_memory(self):
+        return len(self.final)
+
+    def subsets(self):
+        return self.ids.items()
+
+    def states(self):
+        return zip(self.final, self.transitions)
+
+    def close(self):
+        pass
+
+
+class SpilledSubsetTable(SubsetTable):
+    """
+        Same as SubsetTable but kept in a sqlite file, which is removed by close()
+    """
+
+    # sqlite's page cache, the only thing that still grows in memory once spilled
+    cache_size = 4 * 1024 * 1024
+
+    def __init__(self, filename=None, table=None):
+        import sqlite3
+        import tempfile
+
+        if filename == None:
+            fd, filename = tempfile.mkstemp(suffix='.sqlite')
+            os.close(fd)
+        elif os.path.exists(filename):
+            raise FileExistsError("'{}' already exists, the spill file must be a new file".format(filename))
+        self.filename = filename
+        self.db = sqlite3.connect(filename)
+        self.db.execute('PRAGMA cache_size = -{}'.format(self.cache_size // 1024))
+        self.db.execute('CREATE TABLE subsets (subset TEXT PRIMARY KEY, id INTEGER)')
+        self.db.execute('CREATE TABLE frontier (seq INTEGER PRIMARY KEY AUTOINCREMENT, subset TEXT, id INTEGER)')
+        self.db.execute('CREATE TABLE states (id INTEGER PRIMARY KEY, final INTEGER)')
+        self.db.execute('CREATE TABLE transitions (source INTEGER, class INTEGER, target INTEGER)')
+        if table != None:
+            self.db.executemany('INSERT INTO subsets VALUES (?, ?)',
+                                ((self.key(subset), id) for subset, id in table.subsets()))
+            self.db.executemany('INSERT INTO frontier (subset, id) VALUES (?, ?)',
+                                ((self.key(subset), id) for subset, id in table.frontier))
+            self.db.executemany('INSERT INTO states VALUES (?, ?)', enumerate(table.final))
+            self.db.executemany('INSERT INTO transitions VALUES (?, ?, ?)',
+                                ((id, c, target) for id, transitions in enumerate(table.transitions)
+                                 if transitions != None for c, target in transitions.items()))
+
+    @staticmethod
+    def key(subset):
+        return ','.join(str(id) for id in subset)
+
+    @staticmethod
+    def subset(key):
+        return tuple(int(id) for id in key.split(','))
+
+    def get(self, subset):
+        row = self.db.execute('SELECT id FROM subsets WHERE subset = ?', (self.key(subset),)).fetchone()
+        return row[0] if row else None
+
+    def add(self, subset, id, final):
+        key = self.key(subset)
+        self.db.execute('INSERT INTO subsets VALUES (?, ?)', (key, id))
+        self.db.execute('INSERT INTO frontier (subset, id) VALUES (?, ?)', (key, id))
+        self.db.execute('INSERT INTO states VALUES (?, ?)', (id, final))
+
+    def set_transitions(self, id, transitions):
+        self.db.executemany('INSERT INTO transitions VALUES (?, ?, ?)',
+                            ((id, c, target) for c, target in transitions.items()))
+
+    def pop(self):
+        row = self.db.execute('SELECT seq, subset, id FROM frontier ORDER BY seq LIMIT 1').fetchone()
+        if row == None:
+            return None
+        self.db.execute('DELETE FROM frontier WHERE seq = ?', (row[0],))
+        return self.subset(row[1]), row[2]
+
+    def pending(self):
+        return self.db.execute('SELECT COUNT(*) FROM frontier').fetchone()[0]
+
+    def in_memory(self):
+        return 0
+
+    def subsets(self):
+        return ((self.subset(key), id) for key, id in self.db.execute('SELECT subset, id FROM subsets'))
+
+    def states(self):
+        # transitions come back in the order they were added, like the in-memory dicts
+        rows = self.db.execute('SELECT id, final FROM states ORDER BY id')
+        transitions = self.db.execute('SELECT source, class, target FROM transitions ORDER BY source, rowid')
+        following = next(transitions, None)
+        for id, final in rows:
+            state_transitions = {}
+            while following != None and following[0] == id:
+                state_transitions[following[1]] = following[2]
+                following = next(transitions, None)
+            yield bool(final), state_transitions
+
+    def close(self):
+        self.db.close()
+        os.remove(self.filename)
+
+
+def memory_usage():
+    """
+        Resident memory of the process in bytes. The current usage where /proc/self/statm
+        exists, otherwise the peak from the resource module: a long running process that
+        already went through a big job doesn't get its full budget back there. Raises
+        OSError where neither is available.
+    """
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        raise OSError("can't measure the memory of the process on this system")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
 class Automaton:
 
     @staticmethod
     def fromJFLAP(filename):
         """
-            Returns states, transitions
+            Returns the automaton stored in a JFLAP file, raises jflap.InvalidJFLAP
+            if it isn't a finite automaton
         """
+        import jflap
+
         try:
-            with open(filename) as file:
-                jflapDict = xmltodict.parse(file.read())
-                states = {}
-                for state in jflapDict['structure']['automaton']['state']:
-                    obj = State(id=state['@id'], name=state['@name'],
-                                initial=('initial' in state), final=('final' in state))
-                    states[obj.id] = obj
-                for transition in jflapDict['structure']['automaton']['transition']:
-                    id = int(transition['from'])
-                    states[id].addTransition(
-                        transition['read'], states[int(transition['to'])])
-                return Automaton(states=states)
+            try:
+                with open(filename, 'rb') as file:
+                    data = jflap.parse(file)
+            except jflap.UnsupportedJFLAP:
+                with open(filename, 'rb') as file:
+                    data = jflap.parse_generic(file)
+            return Automaton.fromJFLAPData(data)
         except OSError:
-            print("The file: '{}' couln't be opened".format(filename))
+            print("The file: '{}' couln't be opened".format(filename), file=sys.stderr)
+
+    @staticmethod
+    def fromJFLAPString(document):
+        """
+            Same as fromJFLAP for a document already in memory (str or bytes)
+        """
+        import jflap
+
+        if isinstance(document, str):
+            document = document.encode('utf-8')
+        try:
+            data = jflap.parse(document)
+        except jflap.UnsupportedJFLAP:
+            data = jflap.parse_generic(document)
+        return Automaton.fromJFLAPData(data)
+
+    @staticmethod
+    def fromJFLAPData(data):
+        states = {}
+        for id, name, initial, final in zip(data.ids, data.names, data.initial, data.final):
+            states[id] = State(id=id, name=name, initial=initial, final=final)
+        for source, target, read in zip(data.sources, data.targets, data.reads):
+            states[source].addTransition(read, states[target])
+        automaton = Automaton(states=states)
+        automaton.compact()
+        return automaton
 
     def toJFLAP(self, filename):
-        self.clean_states()
-        jflapDict = {'structure': {'type': 'fa', 'automaton': {
-            'state': [state.to_dict() for state in self.states.values()],
-            'transition': [transition for state in self.states.values() for transition in state.transitionList()]}}}
+        document = self.toJFLAPString()
         try:
             with open(filename, 'w') as file:
-                file.write(xmltodict.unparse(jflapDict, pretty=True))
+                file.write(document)
         except OSError:
-            print("The file: '{}' couln't be opened or created".format(filename))
+            print("The file: '{}' couln't be opened or created".format(filename), file=sys.stderr)
+
+    def toJFLAPString(self):
+        import xmltodict
+
+        self.clean_states()
+        jflapDict = {'structure': {'type': 'fa', 'automaton': {
+            'state': [state.to_dict() for state in self.states.values()],
+            'transition': [{'from': state.id, 'to': to.id, 'read': read}
+                           for state in self.states.values()
+                           for read, targets in state.symbol_transitions() for to in targets]}}}
+        return xmltodict.unparse(jflapDict, pretty=True)
 
     def toLatex(self):
+        import re
+        from io import StringIO
+
         result = StringIO()
 
         def escape(st):
@@ -111,9 +603,10 @@ class Automaton:
         qst = ', '.join([escape(x.name) for x in self.states.values()])
         ident = '  '
         result.write(ident + '\\item $Q = \\{' + qst + '\\}$\n')
+        transitions = {st: dict(st.symbol_transitions()) for st in self.states.values()}
         reads = set()
         for st in self.states.values():
-            for tt in st.transitions:
+            for tt in transitions[st]:
                 reads.add(tt)
         reads = sorted(list(reads))
         stt = ", ".join([str(x) for x in reads])
@@ -156,13 +649,14 @@ class Automaton:
         for state in ordered_states:
             name = escape(state.name)
             columns = []
+            state_transitions = transitions[state]
             for r in reads:
-                if r in state.transitions:
-                    if len(state.transitions[r]) > 1:
+                if r in state_transitions:
+                    if len(state_transitions[r]) > 1:
                         columns.append(
-                            '\\{' + ', '.join([escape(x.name) for x in state.transitions[r]]) + '\\}')
+                            '\\{' + ', '.join([escape(x.name) for x in state_transitions[r]]) + '\\}')
                     else:
-                        columns.append(escape(state.transitions[r][0].name))
+                        columns.append(escape(state_transitions[r][0].name))
                 else:
                     columns.append('\\varnothing')
             clst = ' $ & $ '.join(columns)
@@ -176,6 +670,7 @@ class Automaton:
 
     def __init__(self, states=None, initial=None):
         self.states = states if states != None else {}
+        self.last_id = max(self.states) + 1 if self.states else 0
         if initial != None:
             self.initial = initial
         else:
@@ -184,46 +679,94 @@ class Automaton:
                     self.initial = st
                     break
 
+    def new_id(self):
+        id = self.last_id
+        self.last_id += 1
+        return id
+
     def add_state(self, new_state):
+        if new_state.id == -1:
+            new_state.id = self.new_id()
+        elif new_state.id >= self.last_id:
+            self.last_id = new_state.id + 1
         self.states[new_state.id] = new_state
         if new_state.initial:
             self.initial = new_state
+        return new_state
 
     def add_transition(self, from_state, with_value, to_state):
         self.states[from_state].addTransition(with_value, to_state)
 
     def clean_states(self):
-        valid_set = set()
+        valid_set = {self.initial}
         self.traverse(self.initial, valid_set)
         self.states = {x.id: x for x in valid_set}
+        self.compact()
+
+    def compact(self):
+        """
+            Renumbers the states to 0..n-1 keeping their relative order
+        """
+        ordered = sorted(self.states.values())
+        for id, state in enumerate(ordered):
+            state.id = id
+        self.states = {state.id: state for state in ordered}
+        self.last_id = len(ordered)
 
     def traverse(self, node, nodes):
-        for t in node.transitions.values():
-            for child in t:
+        pending = [node]
+        while pending:
+            for child in pending.pop().successors():
                 if child in nodes:
                     continue
                 nodes.add(child)
-                self.traverse(child, nodes)
-
-    def dfa_transform(self):
+                pending.append(child)
 
-        def p(s):
-            result = [[]]
-            for elem in s:
-                result.extend([x + [elem] for x in result])
-            return result
+    def symbol_classes(self):
+        # states straight out of dfa_transform share the classes they were built with
+        states = list(self.states.values())
+        if states and states[0].classes != None and all(state.classes is states[0].classes for state in states):
+            return states[0].classes
+        return SymbolClasses.fromAutomaton(self)
 
-        def names(psetel):
-            to_return = []
-            for id in psetel:
-                to_return.append(self.states[id].name)
-
-            return to_return
+    def transition_table(self, classes=None):
+        """
+            Compiles a deterministic automaton with dense ids (see compact) into a TransitionTable
+        """
+        classes = classes if classes != None else self.symbol_classes()
+        representatives = classes.representatives()
+        rows = [None] * len(self.states)
+        final = [False] * len(self.states)
+        for state in self.states.values():
+            if state.classes is classes:
+                columns = [state.class_transitions.get(c) for c in range(len(classes))]
+            else:
+                columns = [state.targets(read) for read in representatives]
+            row = []
+            for read, targets in zip(representatives, columns):
+                if not targets:
+                    row.append(-1)
+                elif len(targets) > 1:
+                    raise ValueError("state '{}' has more than one transition on '{}'".format(state.name, read))
+                else:
+                    row.append(targets[0].id)
+            rows[state.id] = row
+            final[state.id] = state.final
+        return TransitionTable(classes, rows, self.initial.id, final)
 
-        def is_initial(psetel):  # asumes there is only one and that it is len 1
-            if len(psetel) == 1:
-                return self.states[psetel[0]].initial
-            return False
+    def dfa_transform(self, max_states=None, max_memory=None, spill=False):
+        """
+            Subset construction over the subsets reachable from the initial state.
+            When the DFA kept in memory reaches max_states states or the process
+            max_memory bytes (see memory_usage), raises DeterminizationLimit unless
+            spill is set, in which case the subset table, the frontier and the states
+            built so far move to sqlite (spill is the name of a new file, or True for
+            a temporary one) and the construction goes on from there without growing
+            in memory. Freed memory isn't always given back to the system, so after
+            spilling the memory budget becomes what the process uses right then (if
+            that is more than max_memory) plus room for sqlite's page cache. The State
+            objects and their names are only made once the construction is done.
+        """
 
         def is_final(psetel):
             for id in psetel:
@@ -231,81 +774,238 @@ class Automaton:
                     return True
             return False
 
-        new = self.__class__()
-
-        pset = [tuple(i) for i in p(self.states)]
-        pset_to_id = {}
-
-        c = 0
-        for psetel in pset[1:]:
-            pset_to_id[psetel] = c
-            new.add_state(
-                State(
-                    name="{" + ','.join(names(psetel)) + "}",
-                    initial=is_initial(psetel),
-                    final=is_final(psetel),
-                    id=pset_to_id[psetel]
-                )
-            )
-
-            c += 1
+        def over_budget():
+            if max_states != None and table.in_memory() >= max_states:
+                return '{} states'.format(max_states)
+            # reading /proc isn't free, only look every 1024 states
+            if memory_limit != None and built % 1024 == 0 and memory_usage() >= memory_limit:
+                return '{} bytes'.format(memory_limit)
+            return None
+
+        if max_memory != None:
+            try:
+                memory_usage()
+            except OSError as e:
+                raise ValueError("max_memory can't be enforced: {}".format(e))
+        if isinstance(spill, str) and os.path.exists(spill):
+            raise FileExistsError("'{}' already exists, the spill file must be a new file".format(spill))
+
+        classes = self.symbol_classes()
+        representatives = {read: c for c, read in enumerate(classes.representatives())}
+        moves = {}
+        for state in self.states.values():
+            if state.classes is classes:
+                transitions = state.class_transitions.items()
+            else:
+                transitions = [(representatives[read], targets)
+                               for read, targets in state.symbol_transitions() if read in representatives]
+            moves[state.id] = [(c, [to.id for to in targets]) for c, targets in transitions]
+        table = SubsetTable()
+        built = 0
+        memory_limit = max_memory
+
+        def state_for(psetel):
+            nonlocal table, built, memory_limit
+            id = table.get(psetel)
+            if id != None:
+                return id
+            budget = over_budget()
+            if budget != None:
+                spilled = isinstance(table, SpilledSubsetTable)
+                if not spill or spilled:
+                    # psetel itself is pending too, it just never made it to the table
+                    pending = table.pending() + 1
+                    raise DeterminizationLimit(
+                        'determinization stopped at {}{}: {} states built, {} subsets pending'.format(
+                            budget, ' after spilling' if spilled else '', built, pending),
+                        None if spilled else self.subset_automaton(table, classes), pending)
+                table = SpilledSubsetTable(spill if spill is not True else None, table)
+                if memory_limit != None:
+                    memory_limit = max(memory_limit, memory_usage()) + 2 * SpilledSubsetTable.cache_size
+            id = built
+            built += 1
+            table.add(psetel, id, is_final(psetel))
+            return id
 
-        for psetel in pset[1:]:  # for every state in power set
-            new_state = new.states[pset_to_id[psetel]]
-
-            # 'add up' where original transitions would take you. just the key -> bunch of ids idc
-            addr_upper = {}
-            for original_id in psetel:
-                original_state = self.states[original_id]
-
-                for key in original_state.transitions:
-
-                    if key not in addr_upper:
-                        addr_upper[key] = set(original_state.transitions[key])
-                    else:
-                        addr_upper[key] |= set(original_state.transitions[key])
-
-            # havinng computed that 'addition' proceed to figure out what its corresponding power set tuple would be
-            # and that tuple's corresponding new id is FOR EVERY TRANSITION
-            # that is, for every key
-            for key, value in zip(addr_upper.keys(), addr_upper.values()):
-                corr_id = pset_to_id[tuple(value)]
+        try:
+            state_for((self.initial.id,))
+            while True:
+                popped = table.pop()
+                if popped == None:
+                    break
+                psetel, new_id = popped
+
+                # 'add up' where original transitions would take you, once per symbol class
+                addr_upper = {}
+                for original_id in psetel:
+                    for c, targets in moves[original_id]:
+                        if c not in addr_upper:
+                            addr_upper[c] = set()
+                        addr_upper[c].update(targets)
+
+                # state_for can swap table for the spilled one, so look it up afterwards
+                transitions = {c: state_for(tuple(sorted(value))) for c, value in addr_upper.items()}
+                table.set_transitions(new_id, transitions)
+            return self.subset_automaton(table, classes)
+        finally:
+            table.close()
+
+    def subset_automaton(self, table, classes):
+        """
+            Makes the automaton dfa_transform built in table, naming each state after its subset
+        """
+        new = self.__class__()
+        for id, (final, transitions) in enumerate(table.states()):
+            new.add_state(State(id=id, initial=(id == 0), final=final))
+        for id, (final, transitions) in enumerate(table.states()):
+            # states still in the frontier have no transitions yet
+            new.states[id].set_class_transitions(classes, {
+                c: [new.states[target]] for c, target in (transitions or {}).items()})
+        for subset, id in table.subsets():
+            new.states[id].name = '{' + ','.join(self.states[original].name for original in subset) + '}'
+        return new
 
-                new_state.addTransition(
-                    read=key,
-                    to=new.states[corr_id]
-                )
 
-        return new
+def default_outfile(infile):
+    filename = infile.split(os.sep)[-1]
+    if filename.count('.') > 0:
+        filename = filename.split('.')[0]
+    filename += '_dfa.jff'
+    return os.path.join(os.sep.join(infile.split(os.sep)[:-1]), filename)
+
+
+def convert(infile, outfile=None, latex=False, max_states=None, max_memory=None, spill=False):
+    """
+        Converts infile to a DFA. Returns the LaTeX if latex is set and there is no
+        outfile, otherwise the path that was written. max_memory is in MB, spill is
+        True or the path of a new sqlite file, see dfa_transform.
+    """
+    aut = Automaton.fromJFLAP(infile)
+    if aut == None:
+        raise OSError("The file: '{}' couln't be opened".format(infile))
+    aut = aut.dfa_transform(
+        max_states=max_states,
+        max_memory=max_memory * 1024 * 1024 if max_memory != None else None,
+        spill=spill)
+    if latex:
+        if not outfile:
+            return aut.toLatex()
+        try:
+            with open(outfile, 'w') as f:
+                print(aut.toLatex(), file=f)
+        except OSError:
+            print("The file: '{}' couln't be opened or created".format(outfile), file=sys.stderr)
+            raise
+        return outfile
+    outfile = outfile or default_outfile(infile)
+    document = aut.toJFLAPString()
+    try:
+        with open(outfile, 'w') as f:
+            f.write(document)
+    except OSError:
+        print("The file: '{}' couln't be opened or created".format(outfile), file=sys.stderr)
+        raise
+    return outfile
+
+
+def handle_job(line):
+    """
+        Runs one --serve job, a JSON object with convert's arguments, and returns the JSON reply
+    """
+    import json
+
+    try:
+        job = json.loads(line)
+        if not isinstance(job, dict):
+            raise TypeError('a job must be a JSON object')
+        latex = job.get('latex', False) and not job.get('outfile')
+        result = convert(**job)
+        reply = {'ok': True, 'latex' if latex else 'outfile': result}
+    except Exception as e:
+        # a bad job gets an error reply, the server keeps going
+        reply = {'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)}
+    return json.dumps(reply)
+
+
+def serve(address=None):
+    """
+        Answers jobs, one JSON object per line, from stdin or from a unix socket at address
+    """
+    if address == None:
+        for line in sys.stdin:
+            if line.strip():
+                print(handle_job(line), flush=True)
+        return
+
+    import socketserver
+
+    class JobHandler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+            for line in self.rfile:
+                if line.strip():
+                    self.wfile.write(handle_job(line.decode()).encode() + b'\n')
+
+    import stat
+
+    # a socket left behind by a previous run is replaced, anything else is left alone
+    if os.path.exists(address):
+        if not stat.S_ISSOCK(os.stat(address).st_mode):
+            raise FileExistsError("'{}' exists and isn't a socket".format(address))
+        os.remove(address)
+    with socketserver.UnixStreamServer(address, JobHandler) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    os.remove(address)
 
 
-if __name__ == '__main__':
+def main(argv=None):
     import argparse
-    import sys
-    import os
 
     parser = argparse.ArgumentParser(
         description='Process jflap files to convert from NFA to DFA.')
     parser.add_argument(
-        'infile', help='The path to a file you want to process.')
+        'infile', nargs='?', default=None, help='The path to a file you want to process.')
     parser.add_argument('outfile', nargs='?', default=None,
                         help='The path to a file you want to use as output. The default is infile_dfa')
     parser.add_argument('--latex', '-l', action='store_true')
-    args = parser.parse_args()
-    aut = Automaton.fromJFLAP(args.infile)
-    aut = aut.dfa_transform()
-    if args.latex:
-        if not args.outfile:
-            print(aut.toLatex())
-        else:
-            with open(args.outfile, 'w') as f:
-                print(aut.toLatex(), file=f)
-    else:
-        if not args.outfile:
-            filename = args.infile.split(os.sep)[-1]
-            if filename.count('.') > 0:
-                filename = filename.split('.')[0]
-            filename += '_dfa.jff'
-            aut.toJFLAP(os.path.join(os.sep.join(args.infile.split(os.sep)[:-1]), filename))
-        else:
-            aut.toJFLAP(args.outfile)
+    parser.add_argument('--max-states', type=int, default=None,
+                        help='Stop (or spill) once the DFA has this many states.')
+    parser.add_argument('--max-memory', type=int, default=None,
+                        help='Stop (or spill) once the process uses this many MB.')
+    parser.add_argument('--spill', action='store_true',
+                        help='Keep going past the budget with the construction in a temporary sqlite file.')
+    parser.add_argument('--spill-file', default=None, metavar='PATH',
+                        help='Same as --spill with a new sqlite file at PATH, removed when done.')
+    parser.add_argument('--serve', nargs='?', const='-', default=None, metavar='SOCKET',
+                        help='Keep running and read jobs, one JSON object per line with the arguments of convert, '
+                             'from stdin or from a unix socket at SOCKET.')
+    args = parser.parse_intermixed_args(argv)
+    if args.serve != None:
+        try:
+            serve(None if args.serve == '-' else args.serve)
+        except OSError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        return
+    if args.infile == None:
+        parser.error('infile is required unless --serve is used')
+    try:
+        result = convert(args.infile, args.outfile, latex=args.latex, max_states=args.max_states,
+                         max_memory=args.max_memory, spill=args.spill_file or args.spill)
+    except (DeterminizationLimit, ValueError, FileExistsError) as e:
+        # ValueError is jflap.InvalidJFLAP, the file isn't a usable finite automaton,
+        # FileExistsError a --spill-file that is already there
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    except OSError:
+        # already reported by convert / fromJFLAP
+        sys.exit(1)
+    if args.latex and not args.outfile:
+        print(result)
+
+
+if __name__ == '__main__':
+    main()
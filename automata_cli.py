@@ -0,0 +1,9 @@
+#!/usr/bin/env python
+"""
+    Same as running automata.py, but automata gets imported instead of run as a
+    script, so its bytecode is cached between calls instead of compiled every time
+"""
+from automata import main
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+    Generated matcher (codegen.load) against the table interpreter and re on long inputs
+"""
+import argparse
+import random
+import re
+import time
+
+import codegen
+from examples import nth_from_last
+
+
+def timed(label, accepts, words, baseline=None):
+    start = time.perf_counter()
+    results = [accepts(word) for word in words]
+    elapsed = time.perf_counter() - start
+    speedup = '  ({:.1f}x)'.format(baseline / elapsed) if baseline else ''
+    print('{:<22} {:8.3f}s{}'.format(label, elapsed, speedup))
+    return elapsed, results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark generated DFA matchers.')
+    parser.add_argument('--k', type=int, default=6, help='The DFA accepts words whose k-th symbol from the end is 1.')
+    parser.add_argument('--length', type=int, default=1000000, help='Length of each input.')
+    parser.add_argument('--words', type=int, default=5)
+    parser.add_argument('--regex', action='store_true', help='Also time re.fullmatch on the to_regex pattern.')
+    args = parser.parse_args()
+
+    table = nth_from_last(args.k).dfa_transform().transition_table()
+    rng = random.Random(0)
+    words = [''.join(rng.choice('01') for _ in range(args.length)) for _ in range(args.words)]
+    print('{} states, {} inputs of {} symbols'.format(len(table.rows), args.words, args.length))
+
+    start = time.perf_counter()
+    module = codegen.load(table)
+    print('{:<22} {:8.3f}s'.format('codegen.load', time.perf_counter() - start))
+
+    interpreted, expected = timed('TransitionTable', table.accepts, words)
+    _, results = timed('generated module', module.accepts, words, interpreted)
+    assert results == expected
+    if args.regex:
+        try:
+            pattern = re.compile(codegen.to_regex(table))
+        except ValueError as e:
+            print('{:<22} skipped, {}'.format('re.fullmatch', e))
+        else:
+            _, results = timed('re.fullmatch', lambda word: bool(pattern.fullmatch(word)), words, interpreted)
+            assert results == expected
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""
+    Compares jflap.parse against the xmltodict reader on a generated .jff file
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import jflap
+
+
+def write_jff(path, megabytes, states=1000, seed=0):
+    rng = random.Random(seed)
+    target = megabytes * 1024 * 1024
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8" standalone="no"?>'
+                '<structure>\n\t<type>fa</type>\n\t<automaton>\n')
+        for id in range(states):
+            f.write('\t\t<state id="{0}" name="q{0}">\n\t\t\t<x>{1}.0</x>\n\t\t\t<y>{2}.0</y>\n'.format(
+                id, rng.randrange(1000), rng.randrange(1000)))
+            if id == 0:
+                f.write('\t\t\t<initial/>\n')
+            if id % 7 == 0:
+                f.write('\t\t\t<final/>\n')
+            f.write('\t\t</state>\n')
+        while f.tell() < target:
+            f.write(''.join(
+                '\t\t<transition>\n\t\t\t<from>{}</from>\n\t\t\t<to>{}</to>\n\t\t\t<read>{}</read>\n\t\t</transition>\n'.format(
+                    rng.randrange(states), rng.randrange(states), rng.choice('01ab'))
+                for _ in range(1000)))
+        f.write('\t</automaton>\n</structure>')
+
+
+def timed(parse, path):
+    start = time.perf_counter()
+    with open(path, 'rb') as file:
+        data = parse(file)
+    return time.perf_counter() - start, data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the JFLAP readers.')
+    parser.add_argument('--size', type=int, default=100, help='Size of the generated file in MB.')
+    parser.add_argument('--skip-generic', action='store_true', help='Only time jflap.parse.')
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix='.jff')
+    os.close(fd)
+    try:
+        write_jff(path, args.size)
+        print('file: {:.1f} MB'.format(os.path.getsize(path) / 1024 / 1024))
+        fast, data = timed(jflap.parse, path)
+        print('jflap.parse:         {:8.2f}s  ({} states, {} transitions)'.format(
+            fast, len(data.ids), len(data.reads)))
+        if not args.skip_generic:
+            generic, other = timed(jflap.parse_generic, path)
+            assert other.reads == data.reads and other.ids == data.ids
+            print('jflap.parse_generic: {:8.2f}s  ({:.1f}x slower)'.format(generic, generic / fast))
+    finally:
+        os.remove(path)
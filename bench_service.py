@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+    Load test for service.py: concurrent clients over a unix socket, reports p50/p99 latency
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from examples import nth_from_last
+from service import ConversionService, ServiceClient, serve
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+async def client(address, documents, requests, latencies, rng):
+    conn = await ServiceClient.connect(address)
+    try:
+        for _ in range(requests):
+            document, output = rng.choice(documents)
+            start = time.perf_counter()
+            reply = await conn.convert(document, output)
+            latencies.append(time.perf_counter() - start)
+            assert reply['ok'], reply
+    finally:
+        await conn.close()
+
+
+async def run(args):
+    rng = random.Random(0)
+    documents = [(nth_from_last(k).toJFLAPString(), output) for k in range(2, args.max_k + 1) for output in ('jflap', 'latex')]
+    address = os.path.join(tempfile.mkdtemp(), 'automata.sock')
+    service = ConversionService(workers=args.workers, queue_size=args.queue_size)
+    await service.start()
+    server = asyncio.ensure_future(serve(address, service))
+    while not os.path.exists(address):
+        await asyncio.sleep(0.01)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[client(address, documents, args.requests, latencies, random.Random(rng.random()))
+                           for _ in range(args.clients)])
+    elapsed = time.perf_counter() - start
+    metrics = service.metrics.to_dict()
+    server.cancel()
+    await asyncio.gather(server, return_exceptions=True)
+    await service.stop()
+
+    print('{} requests from {} clients in {:.2f}s ({:.0f} req/s)'.format(
+        len(latencies), args.clients, elapsed, len(latencies) / elapsed))
+    print('client latency  p50 {:7.2f} ms  p99 {:7.2f} ms  mean {:7.2f} ms'.format(
+        percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000, statistics.mean(latencies) * 1000))
+    print('service         p50 {p50_ms:7.2f} ms  p99 {p99_ms:7.2f} ms  deduplicated {deduplicated}'.format(**metrics))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the conversion service.')
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=50, help='Requests per client.')
+    parser.add_argument('--max-k', type=int, default=9, help='Largest NFA used, its DFA has 2^k states.')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--queue-size', type=int, default=16)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+    Cold start latency of the CLI against a --serve process answering the same job
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def cold(command, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=HERE, stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def served(job, runs):
+    process = subprocess.Popen([sys.executable, 'automata_cli.py', '--serve'], cwd=HERE,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    times = []
+    try:
+        for _ in range(runs):
+            start = time.perf_counter()
+            process.stdin.write(json.dumps(job) + '\n')
+            process.stdin.flush()
+            reply = json.loads(process.stdout.readline())
+            times.append(time.perf_counter() - start)
+            assert reply['ok'], reply
+    finally:
+        process.stdin.close()
+        process.wait()
+    return times
+
+
+def report(label, times):
+    print('{:<34} median {:7.2f} ms   min {:7.2f} ms'.format(
+        label, statistics.median(times) * 1000, min(times) * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark CLI start up.')
+    parser.add_argument('--runs', type=int, default=30)
+    parser.add_argument('--infile', default='simple.jff')
+    args = parser.parse_args()
+
+    report('python -c pass', cold([sys.executable, '-c', 'pass'], args.runs))
+    report('automata.py --latex', cold([sys.executable, 'automata.py', args.infile, '-l'], args.runs))
+    report('automata_cli.py --latex', cold([sys.executable, 'automata_cli.py', args.infile, '-l'], args.runs))
+    report('--serve, per latex job', served({'infile': args.infile, 'latex': True}, args.runs))
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+    Turns a deterministic automaton into a generated Python module (or a regular expression).
+
+    The module has one dict per state mapping each symbol straight to the next
+    state's dict, so matching is a single dict lookup per symbol and a missing
+    transition ends the loop through KeyError instead of a check per step.
+    Modules are written to a cache directory named after a hash of the
+    transition table and GENERATOR_VERSION and imported from there, once per process.
+"""
+import hashlib
+import json
+import os
+
+from automata import Automaton
+
+# bump whenever generate() changes what it writes, so cached modules are regenerated
+GENERATOR_VERSION = 1
+
+# re fails or gets slower than the table long before patterns get bigger than this
+MAX_PATTERN = 100000
+
+_loaded = {}
+
+
+def _table(automaton):
+    return automaton.transition_table() if isinstance(automaton, Automaton) else automaton
+
+
+def table_hash(automaton):
+    table = _table(automaton)
+    canonical = json.dumps([GENERATOR_VERSION, table.classes.classes, table.rows, table.initial, table.final])
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def generate(automaton):
+    """
+        Returns the source of a module with accepts(word) for the automaton
+    """
+    table = _table(automaton)
+    lines = ['# generated by codegen.py, do not edit', '']
+    for state in range(len(table.rows)):
+        lines.append('S{} = {{}}'.format(state))
+    for state, row in enumerate(table.rows):
+        entries = ['{!r}: S{}'.format(symbol, target)
+                   for c, target in enumerate(row) if target != -1
+                   for symbol in table.classes.classes[c]]
+        if entries:
+            lines.append('S{}.update({{{}}})'.format(state, ', '.join(entries)))
+    finals = ', '.join('id(S{})'.format(state) for state, final in enumerate(table.final) if final)
+    lines.extend([
+        '',
+        'INITIAL = S{}'.format(table.initial),
+        'FINAL = frozenset(({}{}))'.format(finals, ',' if finals else ''),
+        '',
+        '',
+        'def accepts(word, initial=INITIAL, final=FINAL):',
+        '    state = initial',
+        '    try:',
+        '        for symbol in word:',
+        '            state = state[symbol]',
+        '    except KeyError:',
+        '        return False',
+        '    return id(state) in final',
+        '',
+    ])
+    return '\n'.join(lines)
+
+
+def default_cache_dir():
+    return os.environ.get('AUTOMATA_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'automata')
+
+
+def load(automaton, cache_dir=None):
+    """
+        Returns the generated module for the automaton, writing it to cache_dir the first time
+    """
+    import importlib.util
+
+    table = _table(automaton)
+    digest = table_hash(table)
+    if digest in _loaded:
+        return _loaded[digest]
+    cache_dir = cache_dir or default_cache_dir()
+    filename = os.path.join(cache_dir, 'dfa_{}.py'.format(digest[:32]))
+    if not os.path.exists(filename):
+        os.makedirs(cache_dir, exist_ok=True)
+        # write then rename so concurrent processes never import half a file
+        partial = '{}.{}.tmp'.format(filename, os.getpid())
+        with open(partial, 'w') as file:
+            file.write(generate(table))
+        os.replace(partial, filename)
+    spec = importlib.util.spec_from_file_location('dfa_{}'.format(digest[:32]), filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    _loaded[digest] = module
+    return module
+
+
+def to_regex(automaton, max_length=MAX_PATTERN):
+    """
+        Returns a pattern for re.fullmatch accepting the same words, by state elimination.
+        Only works for single character symbols. The pattern can grow exponentially with
+        the number of states, raises ValueError once part of it is over max_length characters.
+    """
+    import re
+
+    table = _table(automaton)
+    for symbols in table.classes.classes:
+        for symbol in symbols:
+            if not isinstance(symbol, str) or len(symbol) != 1:
+                raise ValueError("symbol {!r} isn't a single character".format(symbol))
+
+    def char_class(symbols):
+        points = sorted(ord(symbol) for symbol in symbols)
+        if len(points) == 1:
+            return re.escape(chr(points[0]))
+        ranges = []
+        for point in points:
+            if ranges and ranges[-1][1] == point - 1:
+                ranges[-1][1] = point
+            else:
+                ranges.append([point, point])
+        return '[' + ''.join(re.escape(chr(a)) if a == b else '{}-{}'.format(re.escape(chr(a)), re.escape(chr(b)))
+                             for a, b in ranges) + ']'
+
+    def group(r):
+        # a single character, escape or class can take a * as it is
+        if len(r) == 1 or re.fullmatch(r'\\.|\[(?:\\.|[^\]\\])*\]', r):
+            return r
+        return '(?:' + r + ')'
+
+    def union(a, b):
+        if a == None:
+            return b
+        if b == None or a == b:
+            return a
+        return '(?:' + a + '|' + b + ')'
+
+    def concat(*parts):
+        # unions are always wrapped in (?:...) so they can be concatenated as they are
+        return ''.join(parts)
+
+    # nodes 0..n-1 are the states, n is a new start and n + 1 a new end
+    n = len(table.rows)
+    start, end = n, n + 1
+    edges = {}
+    for state, row in enumerate(table.rows):
+        symbols = {}
+        for c, target in enumerate(row):
+            if target != -1:
+                symbols.setdefault(target, []).extend(table.classes.classes[c])
+        for target, targets_symbols in symbols.items():
+            edges[(state, target)] = char_class(targets_symbols)
+        if table.final[state]:
+            edges[(state, end)] = ''
+    edges[(start, table.initial)] = ''
+
+    remaining = set(range(n))
+    while remaining:
+        # eliminate the state with the fewest edges first to keep the pattern short
+        k = min(remaining, key=lambda k: sum(1 for i, j in edges if (i == k) != (j == k)))
+        remaining.remove(k)
+        loop = edges.pop((k, k), None)
+        incoming = [(i, r) for (i, j), r in edges.items() if j == k]
+        outgoing = [(j, r) for (i, j), r in edges.items() if i == k]
+        for i, _ in incoming:
+            del edges[(i, k)]
+        for j, _ in outgoing:
+            del edges[(k, j)]
+        middle = group(loop) + '*' if loop != None else ''
+        for i, before in incoming:
+            for j, after in outgoing:
+                edge = edges[(i, j)] = union(edges.get((i, j)), concat(before, middle, after))
+                if len(edge) > max_length:
+                    raise ValueError('the pattern is over {} characters'.format(max_length))
+    result = edges.get((start, end))
+    return result if result != None else '(?!)'
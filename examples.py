@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+"""
+    Automata with known behaviour, used by the benchmarks
+"""
+from automata import Automaton, State
+
+
+def nth_from_last(k):
+    """
+        NFA for words whose k-th symbol from the end is a 1, its DFA has 2^k states
+    """
+    aut = Automaton()
+    states = [aut.add_state(State(initial=(i == 0), final=(i == k))) for i in range(k + 1)]
+    for read in '01':
+        states[0].addTransition(read, states[0])
+    states[0].addTransition('1', states[1])
+    for i in range(1, k):
+        for read in '01':
+            states[i].addTransition(read, states[i + 1])
+    return aut
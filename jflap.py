@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+    Reads JFLAP finite automaton files into flat arrays.
+
+    parse() is a streaming expat reader that only keeps what Automaton needs:
+    state ids, names, initial/final flags and (from, to, read) triples.
+    Layouts it doesn't understand raise UnsupportedJFLAP, in which case
+    parse_generic() goes through xmltodict like fromJFLAP always did. Files
+    that aren't a finite automaton, or aren't well formed, raise InvalidJFLAP
+    from both.
+"""
+from xml.parsers import expat
+
+
+class UnsupportedJFLAP(Exception):
+    pass
+
+
+class InvalidJFLAP(ValueError):
+    pass
+
+
+def check_type(value):
+    if value != None and value.strip() != 'fa':
+        raise InvalidJFLAP('not a finite automaton, the automaton type is {}'.format(value.strip()))
+
+
+class JFLAPData(object):
+
+    def __init__(self):
+        self.ids = []
+        self.names = []
+        self.initial = []
+        self.final = []
+        self.sources = []
+        self.targets = []
+        self.reads = []
+
+    def add_state(self, id, name, initial=False, final=False):
+        self.ids.append(int(id))
+        self.names.append(name)
+        self.initial.append(initial)
+        self.final.append(final)
+
+    def add_transition(self, source, target, read):
+        self.sources.append(int(source))
+        self.targets.append(int(target))
+        self.reads.append(read)
+
+
+class _JFLAPHandler(object):
+    """
+        Tracks where in the document we are and only collects text for
+        type/from/to/read; the character handler is unset everywhere else so
+        the whitespace between elements never reaches Python.
+    """
+
+    def __init__(self, parser):
+        self.data = JFLAPData()
+        self.parser = parser
+        self.depth = 0
+        self.in_automaton = False
+        self.parent = None
+        self.text = []
+        self.transition = None
+
+    def startElement(self, name, attrs):
+        depth = self.depth
+        self.depth = depth + 1
+        if depth == 3:
+            if self.parent == 'transition':
+                if name == 'from' or name == 'to' or name == 'read':
+                    del self.text[:]
+                    self.parser.CharacterDataHandler = self.text.append
+            elif self.parent == 'state':
+                if name == 'initial':
+                    self.data.initial[-1] = True
+                elif name == 'final':
+                    self.data.final[-1] = True
+        elif depth == 2:
+            if not self.in_automaton:
+                return
+            self.parent = name
+            if name == 'transition':
+                self.transition = {}
+            elif name == 'state':
+                if 'id' not in attrs:
+                    raise UnsupportedJFLAP('<state> without an id')
+                self.data.add_state(attrs['id'], attrs.get('name'))
+            elif name == 'block':
+                raise UnsupportedJFLAP('building blocks are not supported')
+        elif depth == 1:
+            if name == 'automaton':
+                self.in_automaton = True
+            elif name == 'type':
+                del self.text[:]
+                self.parser.CharacterDataHandler = self.text.append
+            elif name == 'state' or name == 'transition':
+                raise UnsupportedJFLAP('<{}> outside of <automaton>'.format(name))
+        elif depth == 0 and name != 'structure':
+            raise UnsupportedJFLAP('root element is <{}>'.format(name))
+
+    def endElement(self, name):
+        depth = self.depth = self.depth - 1
+        if depth == 3:
+            if self.parser.CharacterDataHandler is not None:
+                self.parser.CharacterDataHandler = None
+                self.transition[name] = ''.join(self.text).strip() or None
+        elif depth == 2:
+            self.parent = None
+            if name == 'transition' and self.in_automaton:
+                transition = self.transition
+                if transition.get('from') is None or transition.get('to') is None:
+                    raise UnsupportedJFLAP('<transition> without from/to')
+                self.data.add_transition(
+                    transition['from'], transition['to'], transition.get('read'))
+        elif depth == 1:
+            if name == 'automaton':
+                self.in_automaton = False
+            elif name == 'type':
+                self.parser.CharacterDataHandler = None
+                check_type(''.join(self.text))
+
+
+def parse(file):
+    """
+        Returns a JFLAPData from a binary file object or bytes
+    """
+    parser = expat.ParserCreate()
+    handler = _JFLAPHandler(parser)
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.startElement
+    parser.EndElementHandler = handler.endElement
+    # same as xmltodict: don't expand entities
+    parser.DefaultHandler = lambda x: None
+    parser.ExternalEntityRefHandler = lambda *x: 1
+    try:
+        if hasattr(file, 'read'):
+            parser.ParseFile(file)
+        else:
+            parser.Parse(file, True)
+    except InvalidJFLAP:
+        raise
+    except expat.ExpatError as e:
+        raise InvalidJFLAP('malformed XML: {}'.format(e))
+    except ValueError as e:
+        raise InvalidJFLAP(str(e))
+    return handler.data
+
+
+def parse_generic(file):
+    """
+        Same as parse() but through xmltodict, for files parse() rejects
+    """
+    import xmltodict
+
+    try:
+        jflapDict = xmltodict.parse(file, force_list=('state', 'transition'))
+    except expat.ExpatError as e:
+        raise InvalidJFLAP('malformed XML: {}'.format(e))
+    try:
+        structure = jflapDict['structure']
+        check_type(structure.get('type'))
+        automaton = structure['automaton'] if 'automaton' in structure else structure
+        data = JFLAPData()
+        for state in automaton.get('state') or []:
+            data.add_state(state['@id'], state.get('@name'),
+                           initial=('initial' in state), final=('final' in state))
+        for transition in automaton.get('transition') or []:
+            data.add_transition(
+                transition['from'], transition['to'], transition.get('read'))
+    except (KeyError, TypeError, AttributeError) as e:
+        raise InvalidJFLAP('missing {} in the JFLAP document'.format(e))
+    except InvalidJFLAP:
+        raise
+    except ValueError as e:
+        raise InvalidJFLAP(str(e))
+    return data
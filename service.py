@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+"""
+    Local conversion service on top of asyncio.
+
+    Clients send one JSON object per line and get one JSON line back per request,
+    carrying the same "id":
+
+        {"id": 1, "jflap": "<structure>...</structure>", "output": "latex"}
+        {"id": 1, "ok": true, "latex": "\\begin{enumerate}...", "latency_ms": 3.2}
+
+    "output" is "jflap" (the default) or "latex"; "max_states" and "max_memory"
+    (in MB, like the command line) are passed on to dfa_transform. {"op": "metrics"} replies with latency
+    percentiles instead.
+
+    Conversions run in a process pool. Jobs wait in a bounded queue and a
+    connection isn't read any further while the queue is full, so clients
+    that send too much are slowed down instead of piling up work. Requests
+    identical to one that is still running share its result.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+JOB_FIELDS = ('jflap', 'output', 'max_states', 'max_memory')
+
+
+def convert_document(document, output='jflap', max_states=None, max_memory=None):
+    """
+        Runs in the process pool, returns the reply fields for one job. max_memory is in MB.
+    """
+    from automata import Automaton
+
+    try:
+        aut = Automaton.fromJFLAPString(document).dfa_transform(
+            max_states=max_states,
+            max_memory=max_memory * 1024 * 1024 if max_memory != None else None)
+        if output == 'latex':
+            return {'ok': True, 'latex': aut.toLatex()}
+        return {'ok': True, 'jflap': aut.toJFLAPString()}
+    except Exception as e:
+        # anything a bad document can raise goes back to the client, the worker keeps going
+        return {'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)}
+
+
+def job_key(job):
+    return hashlib.sha256(json.dumps([job.get(field) for field in JOB_FIELDS]).encode()).hexdigest()
+
+
+class Metrics:
+
+    def __init__(self, window=10000):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.deduplicated = 0
+        self.errors = 0
+
+    def record(self, seconds, ok):
+        self.requests += 1
+        self.latencies.append(seconds)
+        if not ok:
+            self.errors += 1
+
+    def percentile(self, p):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def to_dict(self):
+        result = {'requests': self.requests, 'deduplicated': self.deduplicated, 'errors': self.errors}
+        for p in (50, 90, 99):
+            latency = self.percentile(p)
+            result['p{}_ms'.format(p)] = latency * 1000 if latency != None else None
+        return result
+
+
+class ConversionService:
+
+    def __init__(self, workers=None, queue_size=64, executor=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.executor = executor
+        self.inflight = {}
+        self.metrics = Metrics()
+        self.queue = None
+        self.tasks = []
+
+    async def start(self):
+        if self.executor == None:
+            self.executor = ProcessPoolExecutor(self.workers)
+        self.queue = asyncio.Queue(self.queue_size)
+        self.tasks = [asyncio.ensure_future(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        # shutdown waits for running jobs, keep the loop going meanwhile
+        await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            key, job, future = await self.queue.get()
+            executor = self.executor
+            try:
+                result = await loop.run_in_executor(
+                    executor, convert_document, job['jflap'], job.get('output', 'jflap'),
+                    job.get('max_states'), job.get('max_memory'))
+            except BrokenProcessPool as e:
+                # a worker died (killed, out of memory); every job running in the pool fails
+                # with it, only the first worker to notice replaces the pool
+                if self.executor is executor:
+                    self.executor = ProcessPoolExecutor(self.workers)
+                    executor.shutdown(wait=False)
+                result = {'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)}
+            except Exception as e:
+                result = {'ok': False, 'error': '{}: {}'.format(type(e).__name__, e)}
+            del self.inflight[key]
+            # whoever got the future from enqueue may have cancelled it
+            if not future.done():
+                future.set_result(result)
+            self.queue.task_done()
+
+    async def enqueue(self, job):
+        """
+            Returns a future with the reply fields for job. Waits while the queue is full
+            unless an identical job is already queued or running.
+        """
+        key = job_key(job)
+        future = self.inflight.get(key)
+        if future != None:
+            self.metrics.deduplicated += 1
+            return future
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            await self.queue.put((key, job, future))
+        except BaseException:
+            del self.inflight[key]
+            raise
+        return future
+
+    async def handle(self, request):
+        """
+            Returns the reply to one request, without going through a connection
+        """
+        future = await self.admit(request, time.perf_counter())
+        return await future
+
+    async def admit(self, request, start):
+        """
+            Queues request and returns a future with its full reply (id, latency included)
+        """
+        loop = asyncio.get_running_loop()
+        if request.get('op') == 'metrics':
+            reply = dict(self.metrics.to_dict(), ok=True)
+        elif not isinstance(request.get('jflap'), str):
+            reply = {'ok': False, 'error': 'request has no "jflap" document'}
+        else:
+            job = {field: request[field] for field in JOB_FIELDS if field in request}
+            result = await self.enqueue(job)
+            reply_future = loop.create_future()
+
+            def done(result):
+                # the caller stopped waiting (timeout, closed connection)
+                if reply_future.done():
+                    return
+                if result.cancelled():
+                    reply_future.cancel()
+                    return
+                reply = dict(result.result())
+                seconds = time.perf_counter() - start
+                self.metrics.record(seconds, reply['ok'])
+                reply['latency_ms'] = seconds * 1000
+                if 'id' in request:
+                    reply['id'] = request['id']
+                reply_future.set_result(reply)
+
+            result.add_done_callback(done)
+            return reply_future
+        if 'id' in request:
+            reply['id'] = request['id']
+        future = loop.create_future()
+        future.set_result(reply)
+        return future
+
+    async def handle_connection(self, reader, writer):
+        pending = set()
+
+        async def reply(future):
+            writer.write(json.dumps(await future).encode() + b'\n')
+            await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                start = time.perf_counter()
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('request is not a JSON object')
+                except ValueError as e:
+                    writer.write(json.dumps({'ok': False, 'error': str(e)}).encode() + b'\n')
+                    continue
+                # this is where backpressure happens: the next line isn't read until there's room
+                task = asyncio.ensure_future(reply(await self.admit(request, start)))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending, return_exceptions=True)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # server shutting down; asyncio before 3.12 logs handlers that end cancelled
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            writer.close()
+
+
+class ServiceClient:
+    """
+        Minimal client, the stand-in for the tools that talk to the service
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+        self.waiting = {}
+        self.listener = asyncio.ensure_future(self._listen())
+
+    @staticmethod
+    async def connect(address, limit=2 ** 26):
+        if isinstance(address, tuple):
+            reader, writer = await asyncio.open_connection(*address, limit=limit)
+        else:
+            reader, writer = await asyncio.open_unix_connection(address, limit=limit)
+        return ServiceClient(reader, writer)
+
+    async def _listen(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            reply = json.loads(line)
+            future = self.waiting.pop(reply.get('id'), None)
+            if future != None:
+                future.set_result(reply)
+        for future in self.waiting.values():
+            future.set_exception(ConnectionError('service closed the connection'))
+
+    async def request(self, **fields):
+        self.next_id += 1
+        fields['id'] = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[self.next_id] = future
+        self.writer.write(json.dumps(fields).encode() + b'\n')
+        await self.writer.drain()
+        return await future
+
+    async def convert(self, document, output='jflap', **options):
+        return await self.request(jflap=document, output=output, **options)
+
+    async def metrics(self):
+        return await self.request(op='metrics')
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.listener.cancel()
+
+
+async def serve(address, service, limit=2 ** 26):
+    """
+        Serves on a unix socket path or a (host, port) pair until cancelled
+    """
+    if isinstance(address, tuple):
+        server = await asyncio.start_server(service.handle_connection, *address, limit=limit)
+    else:
+        server = await asyncio.start_unix_server(service.handle_connection, address, limit=limit)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if not isinstance(address, tuple) and os.path.exists(address):
+            os.remove(address)
+
+
+async def main(args):
+    service = ConversionService(workers=args.workers, queue_size=args.queue_size)
+    await service.start()
+    try:
+        await serve((args.host, args.port) if args.port else args.socket, service)
+    finally:
+        await service.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Serve NFA to DFA conversions over a local socket.')
+    parser.add_argument('--socket', default='automata.sock', help='Unix socket to listen on.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None, help='Listen on TCP instead of a unix socket.')
+    parser.add_argument('--workers', type=int, default=None, help='Size of the process pool.')
+    parser.add_argument('--queue-size', type=int, default=64, help='Jobs that can wait for a worker.')
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
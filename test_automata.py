@@ -0,0 +1,343 @@
+from automata import *
+
+
+def test_unattached_states_are_distinct():
+    a, b = State(), State()
+    assert a != b
+    assert a == a
+    assert len({a, b}) == 2
+    assert a.name == 'q?'
+
+
+def test_add_state_allocates_dense_ids():
+    automaton = Automaton()
+    states = [automaton.add_state(State(initial=(i == 0))) for i in range(3)]
+    assert [state.id for state in states] == [0, 1, 2]
+    assert [state.name for state in states] == ['q0', 'q1', 'q2']
+    assert states[0] != states[1]
+    assert automaton.initial is states[0]
+
+
+def test_compact_renumbers_from_zero():
+    automaton = Automaton.fromJFLAP('simple.jff')
+    assert sorted(automaton.states) == [0, 1, 2, 3]
+    assert automaton.states[3].name == '{q3}'
+
+
+def test_jflap_readers_agree():
+    import jflap
+
+    for filename in ('answ.jff', 'simple.jff'):
+        with open(filename, 'rb') as file:
+            fast = jflap.parse(file)
+        with open(filename, 'rb') as file:
+            generic = jflap.parse_generic(file)
+        assert vars(fast) == vars(generic)
+
+
+def test_jflap_rejects_other_automata_and_bad_xml():
+    import jflap
+    import pytest
+
+    pda = b'<structure><type>pda</type><automaton><state id="0"/></automaton></structure>'
+    for parse in (jflap.parse, jflap.parse_generic):
+        with pytest.raises(jflap.InvalidJFLAP):
+            parse(pda)
+        with pytest.raises(jflap.InvalidJFLAP):
+            parse(b'<structure><type>fa')
+    with pytest.raises(jflap.InvalidJFLAP):
+        Automaton.fromJFLAPString(pda)
+
+
+def letters_and_digits():
+    """
+        Accepts words of letters with an 'x' somewhere, digits go back to the start
+    """
+    automaton = Automaton()
+    states = [automaton.add_state(State(initial=(i == 0), final=(i == 1))) for i in range(2)]
+    for symbol in 'abcdefghijklmnopqrstuvwyz':
+        states[0].addTransition(symbol, states[0])
+        states[1].addTransition(symbol, states[1])
+    for symbol in '0123456789':
+        states[0].addTransition(symbol, states[0])
+        states[1].addTransition(symbol, states[0])
+    states[0].addTransition('x', states[1])
+    states[1].addTransition('x', states[1])
+    return automaton
+
+
+def test_symbol_classes():
+    classes = letters_and_digits().symbol_classes()
+    assert len(classes) == 3
+    assert classes.lookup('b') == classes.lookup('q') != classes.lookup('x')
+    assert classes.lookup('5') == classes.lookup('0')
+    assert classes.lookup('!') == -1
+
+
+def test_dfa_keeps_one_transition_per_class():
+    dfa = letters_and_digits().dfa_transform()
+    assert all(len(state.class_transitions) <= 3 for state in dfa.states.values())
+    assert len(dfa.initial.symbol_transitions()) == 36
+    assert len(dfa.initial.transitionList()) == 36
+    assert 'read: 5' in str(dfa.initial)
+    table = dfa.transition_table()
+    assert len(table.classes) == 3
+    assert table.accepts('abxc') and not table.accepts('abx1') and not table.accepts('ab!x')
+
+    # using transitions by hand switches the state back to one entry per symbol
+    dfa.initial.addTransition('!', dfa.initial)
+    assert dfa.initial.class_transitions == None
+    assert len(dfa.initial.transitions) == 37
+    assert '<read>!</read>' in dfa.toJFLAPString()
+    table = dfa.transition_table()
+    assert table.accepts('a!bxc') and not table.accepts('ax!')
+
+
+def random_nfa(rng, states=5, alphabet='abc'):
+    automaton = Automaton()
+    nodes = [automaton.add_state(State(initial=(i == 0), final=(rng.random() < 0.3))) for i in range(states)]
+    for node in nodes:
+        for symbol in alphabet:
+            for target in rng.sample(nodes, rng.randrange(3)):
+                node.addTransition(symbol, target)
+    return automaton
+
+
+def nfa_accepts(automaton, word):
+    current = {automaton.initial}
+    for symbol in word:
+        current = {target for state in current for target in state.transitions.get(symbol, [])}
+    return any(state.final for state in current)
+
+
+def all_words(alphabet, max_length):
+    import itertools
+
+    return [''.join(word) for n in range(max_length + 1) for word in itertools.product(alphabet, repeat=n)]
+
+
+def test_dfa_transform_matches_nfa():
+    import random
+
+    rng = random.Random(1)
+    words = all_words('abc', 5)
+    for _ in range(50):
+        nfa = random_nfa(rng)
+        table = nfa.dfa_transform().transition_table()
+        assert [table.accepts(word) for word in words] == [nfa_accepts(nfa, word) for word in words]
+
+
+def test_spilled_dfa_matches_in_memory(tmp_path):
+    import random
+
+    rng = random.Random(2)
+    words = all_words('abc', 5)
+    for _ in range(10):
+        nfa = random_nfa(rng, states=7)
+        expected = nfa.dfa_transform()
+        spilled = nfa.dfa_transform(max_states=2, spill=str(tmp_path / 'spill.sqlite'))
+        assert len(spilled.states) == len(expected.states)
+        expected, spilled = expected.transition_table(), spilled.transition_table()
+        assert [spilled.accepts(word) for word in words] == [expected.accepts(word) for word in words]
+    temporary = random_nfa(rng, states=7).dfa_transform(max_states=1, spill=True)
+    assert len(temporary.states) >= 1
+
+
+def test_determinization_limit():
+    import pytest
+
+    nfa = Automaton.fromJFLAP('answ.jff')
+    with pytest.raises(DeterminizationLimit) as limit:
+        nfa.dfa_transform(max_states=3)
+    assert len(limit.value.automaton.states) == 3
+    # 8 states in the full DFA, the one that hit the limit counts as pending
+    assert limit.value.pending >= 1
+    assert '3 states built' in str(limit.value)
+    assert len(nfa.dfa_transform(max_states=8).states) == 8
+
+
+def test_memory_budget_uses_current_usage():
+    import pytest
+
+    nfa = Automaton.fromJFLAP('answ.jff')
+    with pytest.raises(DeterminizationLimit):
+        nfa.dfa_transform(max_memory=1)
+    # a big allocation that is gone by now doesn't count against the next job
+    big = bytearray(256 * 2 ** 20)
+    big[::4096] = b'x' * len(big[::4096])
+    del big
+    assert len(nfa.dfa_transform(max_memory=memory_usage() + 128 * 2 ** 20).states) == 8
+
+
+
+def test_spilling_keeps_memory_bounded(tmp_path):
+    import pytest
+    from examples import nth_from_last
+
+    nfa = nth_from_last(14)
+    spill = tmp_path / 'spill.sqlite'
+    dfa = nfa.dfa_transform(max_states=1024, max_memory=memory_usage() + 5 * 2 ** 20, spill=str(spill))
+    assert len(dfa.states) == 2 ** 14
+    assert dfa.initial.name == '{q0}'
+    assert not spill.exists()
+
+    spill.write_text('keep me')
+    with pytest.raises(FileExistsError):
+        nfa.dfa_transform(max_states=1, spill=str(spill))
+    assert spill.read_text() == 'keep me'
+
+
+def test_spill_options(tmp_path, capsys):
+    import pytest
+    from automata import main
+
+    out = tmp_path / 'out.jff'
+    main(['answ.jff', '--spill', str(out), '--max-states', '2'])
+    assert Automaton.fromJFLAP(str(out)).transition_table().accepts('aaabb') == \
+        Automaton.fromJFLAP('answ.jff').dfa_transform().transition_table().accepts('aaabb')
+
+    spill = tmp_path / 'spill.sqlite'
+    spill.write_text('keep me')
+    with pytest.raises(SystemExit):
+        main(['answ.jff', str(out), '--spill-file', str(spill), '--max-states', '2'])
+    assert 'already exists' in capsys.readouterr().err
+    assert spill.read_text() == 'keep me'
+
+
+def test_memory_usage_without_proc(monkeypatch):
+    import automata
+    import pytest
+    import sys
+
+    def no_proc(*args, **kwargs):
+        raise OSError('no /proc here')
+
+    monkeypatch.setattr(automata, 'open', no_proc, raising=False)
+    assert memory_usage() > 0
+
+    monkeypatch.setitem(sys.modules, 'resource', None)
+    with pytest.raises(OSError):
+        memory_usage()
+    with pytest.raises(ValueError):
+        Automaton.fromJFLAPString(open('answ.jff').read()).dfa_transform(max_memory=2 ** 40)
+
+
+def test_count_words_matches_brute_force():
+    import random
+
+    rng = random.Random(3)
+    for _ in range(30):
+        nfa = random_nfa(rng)
+        table = nfa.dfa_transform().transition_table()
+        expected = [0] * 6
+        for word in all_words('abc', 5):
+            if nfa_accepts(nfa, word):
+                expected[len(word)] += 1
+        assert table.count_words(5) == expected
+        assert table.count_words(5, modulus=7) == [count % 7 for count in expected]
+
+
+def test_words_are_accepted_words_in_shortlex_order():
+    import itertools
+    import random
+
+    rng = random.Random(4)
+    for _ in range(30):
+        nfa = random_nfa(rng)
+        table = nfa.dfa_transform().transition_table()
+        expected = [word for word in all_words('abc', 5) if nfa_accepts(nfa, word)]
+        assert list(table.words(max_length=5)) == expected
+        assert list(itertools.islice(table.words(), 10)) == list(table.words(max_length=10))[:10]
+
+
+def test_words_stops_on_finite_languages():
+    automaton = Automaton()
+    states = [automaton.add_state(State(initial=(i == 0), final=(i == 2))) for i in range(3)]
+    states[0].addTransition('a', states[1])
+    states[1].addTransition('b', states[2])
+    states[1].addTransition('c', states[2])
+    assert list(automaton.transition_table().words()) == ['ab', 'ac']
+
+
+def test_sample_is_uniform_over_accepted_words():
+    import collections
+    import pytest
+    import random
+
+    table = Automaton.fromJFLAP('answ.jff').dfa_transform().transition_table()
+    accepted = set(table.words(max_length=5)) - set(table.words(max_length=4))
+    rng = random.Random(5)
+    draw = table.sampler(5, rng)
+    counts = collections.Counter(draw() for _ in range(4000))
+    assert set(counts) == accepted
+    assert min(counts.values()) > 4000 / len(accepted) / 2
+    assert table.sample(5, rng) in accepted
+    with pytest.raises(ValueError):
+        table.sample(2)
+    with pytest.raises(ValueError):
+        table.sampler(2)
+
+
+def test_serve_jobs_report_errors(tmp_path):
+    import json
+    import pytest
+    from automata import handle_job, serve
+
+    assert json.loads(handle_job('[1, 2]'))['ok'] == False
+    assert json.loads(handle_job('{"infile": "answ.jff", "bogus": 1}'))['ok'] == False
+    reply = json.loads(handle_job(json.dumps({'infile': 'answ.jff', 'outfile': str(tmp_path / 'missing' / 'out.jff')})))
+    assert reply['ok'] == False
+    reply = json.loads(handle_job(json.dumps({'infile': 'answ.jff', 'latex': True})))
+    assert reply['ok'] == True and reply['latex'].startswith('\\begin')
+
+    not_a_socket = tmp_path / 'automata.sock'
+    not_a_socket.write_text('keep me')
+    with pytest.raises(FileExistsError):
+        serve(str(not_a_socket))
+    assert not_a_socket.read_text() == 'keep me'
+
+
+def test_generated_matchers_agree_with_the_table(tmp_path, monkeypatch):
+    import random
+    import re
+    import codegen
+
+    monkeypatch.setattr(codegen, '_loaded', {})
+    rng = random.Random(6)
+    checked = 0
+    for alphabet in ('abc', '-]^\\[.'):
+        words = all_words(alphabet, 4)
+        for _ in range(30):
+            table = random_nfa(rng, states=4, alphabet=alphabet).dfa_transform().transition_table()
+            expected = [table.accepts(word) for word in words]
+            module = codegen.load(table, str(tmp_path))
+            assert [module.accepts(word) for word in words] == expected
+            try:
+                pattern = re.compile(codegen.to_regex(table))
+            except ValueError:
+                continue
+            assert [bool(pattern.fullmatch(word)) for word in words] == expected
+            checked += 1
+    assert checked > 40
+
+
+def test_codegen_cache_key(tmp_path, monkeypatch):
+    import codegen
+    import pytest
+
+    monkeypatch.setattr(codegen, '_loaded', {})
+    table = Automaton.fromJFLAP('answ.jff').dfa_transform().transition_table()
+    codegen.load(table, str(tmp_path))
+    codegen.load(table, str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+
+    table.final[table.initial] = not table.final[table.initial]
+    codegen.load(table, str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 2
+
+    monkeypatch.setattr(codegen, 'GENERATOR_VERSION', codegen.GENERATOR_VERSION + 1)
+    codegen.load(table, str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 3
+
+    with pytest.raises(ValueError):
+        codegen.to_regex(table, max_length=10)
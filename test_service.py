@@ -0,0 +1,158 @@
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import service
+from service import ConversionService, ServiceClient
+
+
+class BlockingConverter:
+    """
+        Stands in for convert_document: counts calls and holds them until released
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self, document, output='jflap', max_states=None, max_memory=None):
+        self.calls += 1
+        self.release.wait(10)
+        return {'ok': True, 'jflap': document}
+
+
+async def until(condition, timeout=10):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, 'timed out waiting'
+        await asyncio.sleep(0.01)
+
+
+def run_service(tmp_path, scenario, workers=1, queue_size=4):
+    async def run():
+        address = str(tmp_path / 'service.sock')
+        conversions = ConversionService(workers=workers, queue_size=queue_size,
+                                        executor=ThreadPoolExecutor(workers))
+        await conversions.start()
+        server = asyncio.ensure_future(service.serve(address, conversions))
+        await until((tmp_path / 'service.sock').exists)
+        client = await ServiceClient.connect(address)
+        try:
+            return await scenario(conversions, client, address)
+        finally:
+            await client.close()
+            server.cancel()
+            await asyncio.gather(server, return_exceptions=True)
+            await conversions.stop()
+
+    return asyncio.run(run())
+
+
+def test_identical_requests_share_one_conversion(tmp_path, monkeypatch):
+    converter = BlockingConverter()
+    monkeypatch.setattr(service, 'convert_document', converter)
+
+    async def scenario(conversions, client, address):
+        requests = [asyncio.ensure_future(client.convert('<structure/>')) for _ in range(2)]
+        await until(lambda: conversions.metrics.deduplicated == 1)
+        converter.release.set()
+        return await asyncio.gather(*requests), await client.metrics()
+
+    replies, metrics = run_service(tmp_path, scenario)
+    assert [reply['ok'] for reply in replies] == [True, True]
+    assert converter.calls == 1
+    assert metrics['deduplicated'] == 1 and metrics['requests'] == 2
+
+
+def test_full_queue_stops_reading_the_connection(tmp_path, monkeypatch):
+    converter = BlockingConverter()
+    monkeypatch.setattr(service, 'convert_document', converter)
+
+    async def scenario(conversions, client, address):
+        requests = [asyncio.ensure_future(client.convert('<structure id="{}"/>'.format(i)))
+                    for i in range(6)]
+        # one job running, one queued and one waiting for room; nothing after it is read
+        await until(lambda: converter.calls == 1 and len(conversions.inflight) == 3)
+        metrics = asyncio.ensure_future(client.metrics())
+        done, _ = await asyncio.wait([metrics], timeout=0.2)
+        blocked = (len(conversions.inflight), bool(done))
+        converter.release.set()
+        return blocked, await asyncio.gather(*requests), await metrics
+
+    (inflight, answered), replies, metrics = run_service(
+        tmp_path, scenario, workers=1, queue_size=1)
+    assert inflight == 3 and not answered
+    assert all(reply['ok'] for reply in replies)
+    assert converter.calls == 6 and metrics['ok']
+
+
+def test_bad_requests_get_error_replies(tmp_path):
+    async def scenario(conversions, client, address):
+        reader, writer = await asyncio.open_unix_connection(address)
+        writer.write(b'{not json\n[1, 2]\n')
+        unparsed = [json.loads(await reader.readline()) for _ in range(2)]
+        writer.close()
+        missing = await client.request(output='latex')
+        malformed = await client.convert('<structure><type>fa</type><automaton>')
+        pda = await client.convert('<structure><type>pda</type><automaton/></structure>')
+        return unparsed + [missing, malformed, pda]
+
+    replies = run_service(tmp_path, scenario)
+    assert [reply['ok'] for reply in replies] == [False] * 5
+    assert 'JSON object' in replies[1]['error']
+    assert 'jflap' in replies[2]['error']
+    assert replies[3]['error'].startswith('InvalidJFLAP')
+    assert 'pda' in replies[4]['error']
+
+
+def test_cancelled_requests_keep_the_workers(monkeypatch):
+    converter = BlockingConverter()
+    monkeypatch.setattr(service, 'convert_document', converter)
+    errors = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        conversions = ConversionService(workers=1, executor=ThreadPoolExecutor(1))
+        await conversions.start()
+        try:
+            try:
+                await asyncio.wait_for(conversions.handle({'jflap': '<a/>'}), 0.05)
+            except asyncio.TimeoutError:
+                pass
+            (await conversions.enqueue({'jflap': '<b/>'})).cancel()
+            converter.release.set()
+            # a worker killed by the cancellations would leave this waiting forever
+            return await asyncio.wait_for(conversions.handle({'jflap': '<c/>'}), 10)
+        finally:
+            await conversions.stop()
+
+    assert asyncio.run(run())['ok']
+    assert converter.calls == 3
+    assert errors == []
+
+
+def test_process_pool_recovers_from_a_dead_worker():
+    with open('answ.jff') as file:
+        document = file.read()
+
+    async def run():
+        conversions = ConversionService(workers=1)
+        await conversions.start()
+        try:
+            first = await conversions.handle({'jflap': document, 'output': 'latex'})
+            try:
+                await asyncio.get_running_loop().run_in_executor(conversions.executor, os._exit, 1)
+            except Exception:
+                pass
+            broken = await conversions.handle({'jflap': document})
+            again = await conversions.handle({'jflap': document})
+            return first, broken, again
+        finally:
+            await conversions.stop()
+
+    first, broken, again = asyncio.run(run())
+    assert first['ok'] and first['latex'].startswith('\\begin')
+    assert not broken['ok'] and 'BrokenProcessPool' in broken['error']
+    assert again['ok'] and again['jflap'].startswith('<?xml')